@@ -72,6 +72,9 @@ setup(
         "Source": "https://github.com/stut/displayproxy",
     },
     entry_points={
-        'console_scripts': ["displayproxy=displayproxy.server:main"],
+        'console_scripts': [
+            "displayproxy=displayproxy.server:main",
+            "displayproxy-bench=displayproxy.bench:main",
+        ],
     },
 )
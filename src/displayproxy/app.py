@@ -0,0 +1,245 @@
+"""displayproxy request routing, shared by the server engines."""
+import hmac
+from http import HTTPStatus
+import json
+import sys
+from typing import BinaryIO, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from displayproxy.__version__ import __version__
+from displayproxy.config import ConfigError, RestartRequiredError
+from displayproxy.delta import StaleFrameError
+from displayproxy.profiling import sample_profile, stage, timed_request
+
+__all__ = ['ProxyApp', 'Response']
+
+
+class Response:
+    """An HTTP response produced by the ProxyApp."""
+
+    def __init__(self, status: HTTPStatus, headers: Optional[dict] = None, body: bytes = b''):
+        """
+        Create a Response.
+
+        :param status: The response status.
+        :param headers: The response headers.
+        :param body: The response body.
+        """
+        self.status = status
+        self.headers = headers or {}
+        self.body = body
+
+    @classmethod
+    def text(cls, status: HTTPStatus, text: str, headers: Optional[dict] = None) -> 'Response':
+        """Create a Response with a text body."""
+        return cls(status, headers, bytes(text, 'utf8'))
+
+    @classmethod
+    def json(cls, data) -> 'Response':
+        """Create a 200 Response with a JSON body."""
+        return cls(HTTPStatus.OK, {'Content-type': 'application/json'}, bytes(json.dumps(data), 'utf8'))
+
+
+class ProxyApp:
+    """
+    Routes requests to the display. The server engines parse HTTP and pass
+    each request to `handle`, which blocks until the request is complete.
+    """
+
+    def __init__(self, display, frame_buffer=None, reload_config=None):
+        """
+        Create a ProxyApp.
+
+        :param display: The display to drive.
+        :param frame_buffer: The shared memory frame buffer, if enabled.
+        :param reload_config: A callable that reloads the config and returns
+            the names of the settings that changed, if reloading is supported.
+        """
+        self._display = display
+        self._frame_buffer = frame_buffer
+        self._reload_config = reload_config
+
+    @property
+    def max_upload_size(self) -> int:
+        """Return the largest request body the display accepts."""
+        return self._display.max_upload_size
+
+    def blocks(self, command: str, path: str) -> bool:
+        """
+        Return whether handling a request may block, on decoding, a display
+        refresh or profiling. Requests that don't only read the display's
+        state, so an event loop can handle them without waiting for a thread.
+
+        :param command: The request method.
+        :param path: The request target.
+        """
+        return not (command == 'GET' and urlsplit(path).path in ['/info', '/buttons'])
+
+    def handle(self, command: str, path: str, headers, rfile: BinaryIO) -> Response:
+        """
+        Handle a request, logging it if it is slow.
+
+        :param command: The request method.
+        :param path: The request target.
+        :param headers: The request headers, as an http.client.HTTPMessage.
+        :param rfile: The request body; only read if the request needs it.
+        :return: The response, including the Server-Timing header.
+        """
+        with timed_request() as timer:
+            if command == 'GET':
+                response = self._do_get(path)
+            elif command == 'POST':
+                response = self._do_post(path, headers, rfile)
+            else:
+                response = Response.text(HTTPStatus.NOT_IMPLEMENTED, f'Unsupported method ({command})')
+        response.headers = {
+            'Server': f'displayproxy/{__version__} (https://github.com/stut/displayproxy)',
+            'Server-Timing': timer.server_timing(),
+            **response.headers,
+        }
+        if 0 < self._display.slow_request_ms < timer.elapsed_ms:
+            sys.stderr.write(f"Slow request: {command} {path} took {timer.elapsed_ms:.1f}ms "
+                             f"({timer.describe()})\n")
+        return response
+
+    def _do_get(self, path: str) -> Response:
+        path = urlsplit(path).path
+        if path == '/info':
+            return self._do_get_info()
+        elif path == '/buttons':
+            return self._do_get_buttons()
+        else:
+            return self._do_404()
+
+    def _do_post(self, path: str, headers, rfile: BinaryIO) -> Response:
+        url = urlsplit(path)
+        if url.path == '/update':
+            return self._do_post_update(headers, rfile)
+        elif url.path == '/update/delta':
+            return self._do_post_update_delta(headers, rfile)
+        elif url.path == '/commit' and self._frame_buffer is not None:
+            return self._do_post_commit()
+        elif url.path == '/shutdown':
+            return self._do_shutdown()
+        elif url.path == '/debug/profile' and self._display.admin_token != '':
+            return self._do_post_debug_profile(headers, parse_qs(url.query))
+        elif url.path == '/config' and self._display.admin_token != '' and self._reload_config is not None:
+            return self._do_post_config(headers)
+        else:
+            return self._do_404()
+
+    def _do_404(self) -> Response:
+        """Send a 404 response."""
+        return Response.text(HTTPStatus.NOT_FOUND, 'Not found', {'Content-type': 'text/plain'})
+
+    def _do_get_info(self) -> Response:
+        """Return information about the display."""
+        return Response.json({
+            'width': self._display.width,
+            'height': self._display.height,
+            'frame_id': self._display.frame_id,
+            'shared_memory': self._frame_buffer.name if self._frame_buffer is not None else None,
+        })
+
+    def _do_get_buttons(self) -> Response:
+        """Return the current state of the buttons."""
+        return Response.json(self._display.get_button_status())
+
+    def _read_body(self, headers, rfile: BinaryIO):
+        """
+        Read the request body.
+
+        :return: The body, or an error Response if it is missing or too large.
+        """
+        content_len = int(headers.get('content-length', 0))
+        if content_len == 0:
+            return Response.text(HTTPStatus.BAD_REQUEST, 'No content length')
+        if content_len > self._display.max_upload_size:
+            return Response.text(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, 'Content too large')
+        with stage('read'):
+            return rfile.read(content_len)
+
+    def _check_authorised(self, headers) -> Optional[Response]:
+        """
+        Check the request carries the admin token.
+
+        :return: None if it does, otherwise a 401 Response.
+        """
+        authorization = headers.get('authorization', '')
+        if hmac.compare_digest(authorization.encode('utf8'), f'Bearer {self._display.admin_token}'.encode('utf8')):
+            return None
+        return Response.text(HTTPStatus.UNAUTHORIZED, 'Unauthorized', {'WWW-Authenticate': 'Bearer'})
+
+    def _do_post_update(self, headers, rfile: BinaryIO) -> Response:
+        """Update the display with the posted image."""
+        post_body = self._read_body(headers, rfile)
+        if isinstance(post_body, Response):
+            return post_body
+
+        try:
+            img = self._display.prepare(post_body)
+        except ValueError:
+            return Response.text(HTTPStatus.BAD_REQUEST, 'Invalid image data')
+        img_id = self._display.show(img)
+
+        return Response(HTTPStatus.NO_CONTENT, {'X-Frame-Id': img_id})
+
+    def _do_post_update_delta(self, headers, rfile: BinaryIO) -> Response:
+        """Update the display by applying the posted delta to the current frame."""
+        base_id = headers.get('x-base-frame-id', '')
+        if base_id == '':
+            return Response.text(HTTPStatus.BAD_REQUEST, 'No X-Base-Frame-Id')
+        post_body = self._read_body(headers, rfile)
+        if isinstance(post_body, Response):
+            return post_body
+
+        try:
+            img_id = self._display.show_delta(base_id, post_body)
+        except StaleFrameError:
+            return Response.text(HTTPStatus.CONFLICT, 'Base frame is not the current frame',
+                                 {'X-Frame-Id': self._display.frame_id or ''})
+        except ValueError:
+            return Response.text(HTTPStatus.BAD_REQUEST, 'Invalid delta data')
+
+        return Response(HTTPStatus.NO_CONTENT, {'X-Frame-Id': img_id})
+
+    def _do_post_commit(self) -> Response:
+        """Update the display with the frame in the shared memory buffer."""
+        with stage('read'):
+            img = self._frame_buffer.read()
+        img_id = self._display.show(img)
+
+        return Response(HTTPStatus.NO_CONTENT, {'X-Frame-Id': img_id})
+
+    def _do_post_debug_profile(self, headers, query: dict) -> Response:
+        """Profile live traffic for a number of seconds and return the report."""
+        unauthorised = self._check_authorised(headers)
+        if unauthorised is not None:
+            return unauthorised
+        try:
+            seconds = float(query.get('seconds', ['10'])[0])
+            if not 0 < seconds <= 300:
+                raise ValueError(seconds)
+        except ValueError:
+            return Response.text(HTTPStatus.BAD_REQUEST, 'seconds must be between 0 and 300')
+
+        return Response.text(HTTPStatus.OK, sample_profile(seconds), {'Content-type': 'text/plain'})
+
+    def _do_post_config(self, headers) -> Response:
+        """Reload the config and apply it to the running display."""
+        unauthorised = self._check_authorised(headers)
+        if unauthorised is not None:
+            return unauthorised
+        try:
+            changed = self._reload_config()
+        except RestartRequiredError as e:
+            return Response.text(HTTPStatus.CONFLICT, str(e))
+        except ConfigError as e:
+            return Response.text(HTTPStatus.BAD_REQUEST, str(e))
+
+        return Response.json({'changed': changed})
+
+    def _do_shutdown(self) -> Response:
+        """Stop the display which will cause the process to end."""
+        self._display.shutdown()
+        return Response(HTTPStatus.ACCEPTED)
@@ -0,0 +1,370 @@
+"""displayproxy load generation module."""
+
+from http.client import HTTPException
+import io
+import json
+import random
+import sys
+from threading import Event, Lock, Thread
+from time import monotonic, sleep
+from typing import Optional
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from PIL import Image, ImageDraw
+
+__all__ = ['Bench']
+
+
+def _percentile(values: list, percent: float) -> float:
+    """Return the given percentile of a sorted list of values."""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def _parse_server_timing(header: Optional[str]) -> dict:
+    """
+    Parse a Server-Timing header into a dict of metric names to durations.
+
+    :param header: The header value, e.g. 'decode;dur=12.3, show;dur=4.5'.
+    :return: A dict of metric names to durations in milliseconds.
+    """
+    timings = {}
+    if not header:
+        return timings
+    for metric in header.split(','):
+        bits = [bit.strip() for bit in metric.split(';')]
+        for param in bits[1:]:
+            if param.startswith('dur='):
+                try:
+                    timings[bits[0]] = float(param[4:])
+                except ValueError:
+                    pass
+    return timings
+
+
+class _Stats:
+    """Thread-safe collection of results for one kind of request."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.latencies = []
+        self.errors = {}
+        self.bytes_sent = 0
+        self.server_timings = {}
+
+    def record(self, latency: float, status: str, sent: int = 0, server_timing: Optional[str] = None) -> None:
+        """
+        Record the outcome of one request.
+
+        :param latency: The request latency in seconds.
+        :param status: 'ok', or a description of the error.
+        :param sent: The number of body bytes sent.
+        :param server_timing: The Server-Timing response header, if any.
+        """
+        with self._lock:
+            if status == 'ok':
+                self.latencies.append(latency)
+                self.bytes_sent += sent
+                for name, duration in _parse_server_timing(server_timing).items():
+                    self.server_timings.setdefault(name, []).append(duration)
+            else:
+                self.errors[status] = self.errors.get(status, 0) + 1
+
+    def summary(self, elapsed: float) -> dict:
+        """Summarise the results collected over the given number of seconds."""
+        with self._lock:
+            latencies = sorted(self.latencies)
+            errors = sum(self.errors.values())
+            total = len(latencies) + errors
+            return {
+                'requests': total,
+                'ok': len(latencies),
+                'errors': dict(self.errors),
+                'error_rate': errors / total if total else 0.0,
+                'throughput': len(latencies) / elapsed if elapsed else 0.0,
+                'mb_per_second': self.bytes_sent / elapsed / 1024 / 1024 if elapsed else 0.0,
+                'latency_ms': {
+                    'p50': _percentile(latencies, 50) * 1000,
+                    'p90': _percentile(latencies, 90) * 1000,
+                    'p99': _percentile(latencies, 99) * 1000,
+                    'max': (latencies[-1] if latencies else 0.0) * 1000,
+                },
+                'server_timing_ms': {name: sum(durations) / len(durations)
+                                     for name, durations in self.server_timings.items()},
+            }
+
+
+class Bench:
+    """
+    Bench drives a running displayproxy server with concurrent uploads while
+    polling its buttons, and reports how it coped.
+    """
+
+    def __init__(self, url: str = 'http://localhost:8000', concurrency: int = 4,
+                 image_format: str = 'png', width: int = 0, height: int = 0,
+                 duplicate_ratio: float = 0.0, frames: int = 16,
+                 button_pollers: int = 1, button_interval: float = 0.5,
+                 timeout: float = 120.0, seed: Optional[int] = None):
+        """
+        Create a Bench.
+
+        :param url: The base URL of the server.
+        :param concurrency: The number of concurrent upload workers.
+        :param image_format: A pillow image format, or 'raw' for raw RGB bytes.
+        :param width: The width of the uploaded images; 0 asks the server.
+            Raw images are always the server's width.
+        :param height: The height of the uploaded images; 0 asks the server.
+            Raw images are always the server's height.
+        :param duplicate_ratio: The fraction of uploads that repeat the
+            previous frame.
+        :param frames: The number of distinct frames to generate.
+        :param button_pollers: The number of concurrent /buttons pollers.
+        :param button_interval: Seconds each poller waits between requests.
+        :param timeout: The request timeout in seconds.
+        :param seed: Seed for the frame generator and duplicate choices.
+        """
+        self._url = url.rstrip('/')
+        self._concurrency = concurrency
+        self._image_format = image_format
+        self._width = width
+        self._height = height
+        self._duplicate_ratio = duplicate_ratio
+        self._frame_count = max(1, frames)
+        self._button_pollers = button_pollers
+        self._button_interval = button_interval
+        self._timeout = timeout
+        self._random = random.Random(seed)
+        self._random_lock = Lock()
+
+        self._frames = []
+        self._last_frame = None
+        self._next_frame = 0
+        self._stop_event = Event()
+        self._update_stats = _Stats()
+        self._button_stats = _Stats()
+
+    def run(self, duration: float = 10.0, requests: int = 0) -> dict:
+        """
+        Run the benchmark.
+
+        :param duration: How long to run for in seconds; ignored if requests
+            is set.
+        :param requests: The total number of uploads to send.
+        :return: A dict summarising the results.
+        """
+        self._prepare_frames()
+
+        remaining = [requests]
+        remaining_lock = Lock()
+
+        def take() -> bool:
+            if not requests:
+                return not self._stop_event.is_set()
+            with remaining_lock:
+                remaining[0] -= 1
+                return remaining[0] >= 0
+
+        threads = [Thread(target=self._upload_worker, args=(take,), daemon=True)
+                   for _ in range(self._concurrency)]
+        pollers = [Thread(target=self._button_worker, daemon=True)
+                   for _ in range(self._button_pollers)]
+
+        start = monotonic()
+        for t in threads + pollers:
+            t.start()
+        if requests:
+            for t in threads:
+                t.join()
+        else:
+            sleep(duration)
+        self._stop_event.set()
+        for t in threads + pollers:
+            t.join()
+        elapsed = monotonic() - start
+
+        return {
+            'config': {
+                'url': self._url,
+                'concurrency': self._concurrency,
+                'format': self._image_format,
+                'width': self._width,
+                'height': self._height,
+                'duplicate_ratio': self._duplicate_ratio,
+                'frame_bytes': sum(len(frame) for frame in self._frames) // len(self._frames),
+                'button_pollers': self._button_pollers,
+            },
+            'elapsed': elapsed,
+            'update': self._update_stats.summary(elapsed),
+            'buttons': self._button_stats.summary(elapsed),
+        }
+
+    def _prepare_frames(self) -> None:
+        """
+        Generate and encode the frames up front so encoding isn't timed.
+
+        :raises ValueError: If pillow cannot write the image format.
+        """
+        # The server can't resize raw pixels, so they must match its resolution.
+        if self._image_format == 'raw' or self._width == 0 or self._height == 0:
+            with urlopen(f'{self._url}/info', timeout=self._timeout) as response:
+                info = json.loads(response.read())
+            if self._image_format == 'raw':
+                self._width, self._height = info['width'], info['height']
+            self._width = self._width or info['width']
+            self._height = self._height or info['height']
+
+        for _ in range(self._frame_count):
+            img = Image.new('RGB', (self._width, self._height), self._random_colour())
+            draw = ImageDraw.Draw(img)
+            for _ in range(20):
+                x1, x2 = sorted(self._random.randrange(self._width) for _ in range(2))
+                y1, y2 = sorted(self._random.randrange(self._height) for _ in range(2))
+                draw.rectangle((x1, y1, x2, y2), fill=self._random_colour())
+            if self._image_format == 'raw':
+                self._frames.append(img.tobytes())
+            else:
+                buf = io.BytesIO()
+                try:
+                    img.save(buf, self._image_format)
+                except (KeyError, OSError):
+                    raise ValueError(f"Unsupported image format: {self._image_format}")
+                self._frames.append(buf.getvalue())
+
+    def _random_colour(self) -> tuple:
+        """Return a random RGB colour."""
+        return tuple(self._random.randrange(256) for _ in range(3))
+
+    def _choose_frame(self) -> bytes:
+        """Return the previous frame or the next distinct frame."""
+        with self._random_lock:
+            if self._last_frame is None or self._random.random() >= self._duplicate_ratio:
+                self._last_frame = self._frames[self._next_frame % len(self._frames)]
+                self._next_frame += 1
+            return self._last_frame
+
+    def _request(self, stats: _Stats, path: str, body: Optional[bytes] = None) -> None:
+        """
+        Send one request and record the outcome.
+
+        :param stats: The stats to record the outcome in.
+        :param path: The request path.
+        :param body: The POST body, or None for a GET request.
+        """
+        req = Request(f'{self._url}{path}', data=body, method='GET' if body is None else 'POST')
+        start = monotonic()
+        try:
+            with urlopen(req, timeout=self._timeout) as response:
+                response.read()
+                stats.record(monotonic() - start, 'ok', len(body or b''), response.headers.get('Server-Timing'))
+        except HTTPError as e:
+            stats.record(monotonic() - start, f'HTTP {e.code}')
+        except (URLError, OSError) as e:
+            stats.record(monotonic() - start, type(getattr(e, 'reason', e)).__name__)
+        except HTTPException as e:
+            # e.g. BadStatusLine or IncompleteRead from a struggling server.
+            stats.record(monotonic() - start, type(e).__name__)
+
+    def _upload_worker(self, take) -> None:
+        """Upload frames until told to stop."""
+        while take():
+            self._request(self._update_stats, '/update', self._choose_frame())
+
+    def _button_worker(self) -> None:
+        """Poll the buttons until told to stop."""
+        while not self._stop_event.is_set():
+            self._request(self._button_stats, '/buttons')
+            self._stop_event.wait(self._button_interval)
+
+
+def _print_report(results: dict) -> None:
+    """Print a human readable report of the results."""
+    config = results['config']
+    print(f"{config['url']}: {config['concurrency']} uploaders, {config['button_pollers']} button pollers, "
+          f"{config['format']} {config['width']}x{config['height']} (~{config['frame_bytes']} bytes), "
+          f"{config['duplicate_ratio']:.0%} duplicates, {results['elapsed']:.1f}s")
+    for name in ['update', 'buttons']:
+        summary = results[name]
+        latency = summary['latency_ms']
+        print(f"\n{name}:")
+        print(f"  requests:   {summary['requests']} ({summary['ok']} ok, {summary['error_rate']:.1%} errors)")
+        print(f"  throughput: {summary['throughput']:.2f} req/s, {summary['mb_per_second']:.2f} MB/s")
+        print(f"  latency:    p50 {latency['p50']:.1f}ms, p90 {latency['p90']:.1f}ms, "
+              f"p99 {latency['p99']:.1f}ms, max {latency['max']:.1f}ms")
+        for error, count in sorted(summary['errors'].items()):
+            print(f"  error:      {error} x{count}")
+        for stage, duration in sorted(summary['server_timing_ms'].items()):
+            print(f"  server:     {stage} {duration:.1f}ms avg")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Generate load against a displayproxy server.')
+    parser.add_argument('--url', default='http://localhost:8000', type=str, metavar='URL',
+                        help='base URL of the server (default: %(default)s)')
+    parser.add_argument('--concurrency', default=4, type=int, metavar='N',
+                        help='number of concurrent uploaders (default: %(default)s)')
+    parser.add_argument('--duration', default=10.0, type=float, metavar='SECONDS',
+                        help='how long to run for (default: %(default)s)')
+    parser.add_argument('--requests', default=0, type=int, metavar='N',
+                        help='total number of uploads; overrides --duration (default: %(default)s)')
+    parser.add_argument('--format', default='png', type=str, metavar='FORMAT',
+                        help='pillow image format, or "raw" for raw RGB bytes in the server resolution '
+                             '(default: %(default)s)')
+    parser.add_argument('--width', default=0, type=int, metavar='WIDTH',
+                        help='image width; 0 uses the server resolution (default: %(default)s)')
+    parser.add_argument('--height', default=0, type=int, metavar='HEIGHT',
+                        help='image height; 0 uses the server resolution (default: %(default)s)')
+    parser.add_argument('--duplicate-ratio', default=0.0, type=float, metavar='RATIO',
+                        help='fraction of uploads that repeat the previous frame (default: %(default)s)')
+    parser.add_argument('--frames', default=16, type=int, metavar='N',
+                        help='number of distinct frames to generate (default: %(default)s)')
+    parser.add_argument('--button-pollers', default=1, type=int, metavar='N',
+                        help='number of concurrent /buttons pollers (default: %(default)s)')
+    parser.add_argument('--button-interval', default=0.5, type=float, metavar='SECONDS',
+                        help='delay between polls by each poller (default: %(default)s)')
+    parser.add_argument('--timeout', default=120.0, type=float, metavar='SECONDS',
+                        help='request timeout (default: %(default)s)')
+    parser.add_argument('--seed', default=None, type=int, metavar='SEED',
+                        help='random seed for repeatable runs')
+    parser.add_argument('--json', action='store_true',
+                        help='print the results as JSON')
+    args = parser.parse_args()
+    if args.format == 'raw' and (args.width or args.height):
+        parser.error('--width and --height cannot be used with --format raw; raw images must match '
+                     'the server resolution')
+
+    bench = Bench(
+        url=args.url,
+        concurrency=args.concurrency,
+        image_format=args.format,
+        width=args.width,
+        height=args.height,
+        duplicate_ratio=args.duplicate_ratio,
+        frames=args.frames,
+        button_pollers=args.button_pollers,
+        button_interval=args.button_interval,
+        timeout=args.timeout,
+        seed=args.seed,
+    )
+    try:
+        results = bench.run(duration=args.duration, requests=args.requests)
+    except ValueError as e:
+        exit(str(e))
+    except (URLError, OSError) as e:
+        exit(f"Error contacting {args.url}: {e}")
+    except KeyboardInterrupt:
+        print("\nKeyboard interrupt received, exiting.", file=sys.stderr)
+        sys.exit(1)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        _print_report(results)
+
+
+if __name__ == '__main__':
+    main()
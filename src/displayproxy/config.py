@@ -1,3 +1,15 @@
+from configparser import ConfigParser, Error as ConfigParserError
+from copy import copy
+
+
+class ConfigError(Exception):
+    """The configuration is invalid."""
+    pass
+
+
+class RestartRequiredError(ConfigError):
+    """The configuration changed in a way that can't be applied while running."""
+    pass
 
 
 class Config:
@@ -60,21 +72,46 @@ class Config:
         },
     }
 
-    def __init__(self, display_type: str, buttons: str, options: str):
+    def __init__(self, display_type: str, buttons: str, options: str, config_file: str = ''):
         """
-        Create a Config object.
+        Create a Config object. Buttons and options in the config file
+        override the display type defaults, and those passed in here
+        override the config file.
 
         :param display_type: The display type.
         :param buttons: A string of button configuration in the format
             'label=spec,label=spec,...'.
         :param options: A dictionary of options specific to the display type,
             in the format 'key=value,key=value,...'.
+        :param config_file: The path to an INI file with [buttons] and
+            [options] sections, or '' for none.
+        """
+        self._sources = (display_type, buttons, options, config_file)
+        try:
+            self._load()
+        except ConfigError as e:
+            exit(f'Error loading configuration: {e}')
+
+    def reloaded(self) -> 'Config':
+        """
+        Return a new Config loaded from the same display type, arguments and
+        config file, picking up any changes to the file.
+
+        :raises ConfigError: If the configuration is invalid.
         """
+        config = copy(self)
+        config._load()
+        return config
+
+    def _load(self) -> None:
+        """Load the configuration from its sources."""
+        display_type, buttons, options, config_file = self._sources
+        file_buttons, file_options = self._read_file(config_file) if config_file else ({}, {})
         type_defaults = self._type_defaults.get(display_type, {})
         self._display_type = type_defaults.get("display_type", display_type)
         self._display_variant = type_defaults.get("display_variant", 'auto')
-        self._buttons = {**type_defaults.get("buttons", {}), **self._parse_buttons(buttons)}
-        self._options = {**type_defaults.get("options", {}), **self._parse_options(options)}
+        self._buttons = {**type_defaults.get("buttons", {}), **file_buttons, **self._parse_buttons(buttons)}
+        self._options = {**type_defaults.get("options", {}), **file_options, **self._parse_options(options)}
 
     @property
     def display_type(self) -> str:
@@ -86,6 +123,11 @@ class Config:
         """Return the display variant."""
         return self._display_variant
 
+    @property
+    def config_file(self) -> str:
+        """Return the path to the config file, or '' if there isn't one."""
+        return self._sources[3]
+
     @property
     def buttons(self) -> dict:
         """Return the button configuration."""
@@ -116,6 +158,28 @@ class Config:
         """Set an option value."""
         self._options[key] = value
 
+    def _read_file(self, path: str) -> tuple:
+        """
+        Read the buttons and options from an INI file.
+
+        :param path: The path to the file.
+        :return: A tuple of the button and option dicts.
+        """
+        parser = ConfigParser(interpolation=None)
+        # Button labels are case sensitive.
+        parser.optionxform = str
+        try:
+            with open(path, 'r', encoding='utf8') as f:
+                parser.read_file(f)
+        except (OSError, ConfigParserError) as e:
+            raise ConfigError(f'Error reading {path}: {e}')
+
+        unknown = [section for section in parser.sections() if section not in ['buttons', 'options']]
+        if unknown:
+            raise ConfigError(f"Unknown sections in {path}: {', '.join(unknown)}; supported: buttons, options")
+        return tuple(dict(parser[section]) if parser.has_section(section) else {}
+                     for section in ['buttons', 'options'])
+
     def _parse_buttons(self, buttons: str) -> dict:
         """
         Parse the button configuration string into a dictionary.
@@ -138,7 +202,7 @@ class Config:
                 buttons_defs['='.join(bits).strip()] = spec.strip()
             return buttons_defs
         except Exception as e:
-            exit(f'Error parsing button configuration: {e}')
+            raise ConfigError(f'Error parsing button configuration: {e}')
 
     def _parse_options(self, options: str) -> dict:
         """
@@ -161,7 +225,7 @@ class Config:
                 options_dict[key.strip()] = value.strip()
             return options_dict
         except Exception as e:
-            exit(f'Error parsing button configuration: {e}')
+            raise ConfigError(f'Error parsing option configuration: {e}')
 
     def _is_truthy_str(self, value: str) -> bool:
         """Return True if the value is a truthy string."""
@@ -0,0 +1,103 @@
+"""
+Delta encoding of frames against the current frame.
+
+A delta is the magic bytes b'DPD1' followed by zero or more tiles. Each tile
+is a big-endian unsigned 16-bit x, y, width and height, followed by
+width * height * 3 bytes of raw RGB pixel data that replace that area of the
+base frame.
+"""
+import hashlib
+import struct
+from typing import Optional
+
+from PIL import Image, ImageChops
+
+__all__ = ['StaleFrameError', 'frame_id', 'encode_delta', 'apply_delta']
+
+_MAGIC = b'DPD1'
+_TILE_HEADER = struct.Struct('>HHHH')
+
+
+class StaleFrameError(Exception):
+    """The delta was encoded against a frame that is no longer displayed."""
+    pass
+
+
+def frame_id(img: Image) -> str:
+    """
+    Return an identifier for the contents of an RGB frame.
+
+    :param img: The frame.
+    :return: A hex digest of the frame size and pixels.
+    """
+    h = hashlib.sha1(f'{img.width}x{img.height};'.encode('utf8'))
+    h.update(img.tobytes())
+    return h.hexdigest()
+
+
+def _prepare(img: Image, size: tuple) -> Image:
+    """Stretch an image to the given size and convert it to RGB, as the server does."""
+    if img.size != size:
+        img = img.resize(size)
+    return img.convert('RGB')
+
+
+def encode_delta(base: Image, img: Image, tile_size: int = 16, size: Optional[tuple] = None) -> bytes:
+    """
+    Encode the tiles of an image that differ from the base frame.
+
+    The server applies deltas to the frame it holds, which is the last
+    uploaded image stretched to the display's native resolution and converted
+    to RGB. Both images are prepared the same way here, so the base can be
+    the image last sent to the server as long as the size is given.
+
+    :param base: The image last uploaded to the server.
+    :param img: The new image.
+    :param tile_size: The width and height of each tile.
+    :param size: The (width, height) returned by /info; defaults to the size
+        of the base.
+    :return: The encoded delta.
+    """
+    size = size or base.size
+    base = _prepare(base, size)
+    img = _prepare(img, size)
+
+    diff = ImageChops.difference(base, img)
+    delta = [_MAGIC]
+    for y in range(0, img.height, tile_size):
+        for x in range(0, img.width, tile_size):
+            box = (x, y, min(x + tile_size, img.width), min(y + tile_size, img.height))
+            if diff.crop(box).getbbox() is None:
+                continue
+            delta.append(_TILE_HEADER.pack(x, y, box[2] - x, box[3] - y))
+            delta.append(img.crop(box).tobytes())
+    return b''.join(delta)
+
+
+def apply_delta(base: Image, delta: bytes) -> Image:
+    """
+    Apply a delta to a copy of the base frame.
+
+    :param base: The RGB frame the delta was encoded against.
+    :param delta: The encoded delta.
+    :return: The new RGB frame.
+    :raises ValueError: If the delta is malformed or does not fit the frame.
+    """
+    if not delta.startswith(_MAGIC):
+        raise ValueError('Invalid delta data')
+
+    img = base.copy()
+    offset = len(_MAGIC)
+    while offset < len(delta):
+        if offset + _TILE_HEADER.size > len(delta):
+            raise ValueError('Truncated delta tile header')
+        x, y, width, height = _TILE_HEADER.unpack_from(delta, offset)
+        offset += _TILE_HEADER.size
+        if width == 0 or height == 0 or x + width > img.width or y + height > img.height:
+            raise ValueError('Delta tile is outside the frame')
+        size = width * height * 3
+        if offset + size > len(delta):
+            raise ValueError('Truncated delta tile data')
+        img.paste(Image.frombytes('RGB', (width, height), delta[offset:offset + size]), (x, y))
+        offset += size
+    return img
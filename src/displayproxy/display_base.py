@@ -2,14 +2,20 @@ from copy import copy
 from datetime import datetime
 from threading import Event, Lock
 from time import sleep
+from typing import Optional
 
 from PIL import Image
 
-from displayproxy.config import Config
+from displayproxy.config import Config, ConfigError, RestartRequiredError
+from displayproxy.delta import StaleFrameError, apply_delta, frame_id
+from displayproxy.preprocess import FramePreprocessor
+from displayproxy.profiling import stage
 
 
 class BaseDisplay:
     """Base class for displays."""
+    # Options that reconfigure can change without reinitialising the display.
+    _live_options = {'max_upload_size', 'slow_request_ms', 'admin_token'}
 
     def __init__(self, config: Config):
         """
@@ -22,28 +28,66 @@ class BaseDisplay:
         """
         self._config = config
         self._shutdown_event = Event()
-        self._button_defs = self._config.buttons
+        self._button_defs = dict(self._config.buttons)
         self._button_status = {label: 0 for label in self._button_defs} if self._button_defs else {}
         self._button_lock = Lock()
+        self._update_lock = Lock()
+        self._preprocessor = FramePreprocessor(self._config)
+        self._frame = None
+        self._frame_id = None
 
+        try:
+            self._load_options()
+        except (ConfigError, ValueError) as e:
+            exit(f'Error in display options: {e}')
+
+    def _load_options(self) -> None:
+        """
+        Read the live options from the config. Subclasses that add live
+        options should extend this and _live_options.
+
+        :raises ConfigError: If an option is invalid.
+        """
         # Base level default options.
         self._max_upload_size = self._config.option_int('max_upload_size', 1024 * 1024 * 5)  # 5MB
+        self._slow_request_ms = self._config.option_float('slow_request_ms', 0.0)  # 0 disables the log
+        self._admin_token = self._config.option_str('admin_token', '')  # Empty disables admin endpoints
 
     @property
     def width(self) -> int:
         """Return the width of the display."""
-        self._config.option_int('width', 0)
+        return self._config.option_int('width', 0)
 
     @property
     def height(self) -> int:
         """Return the height of the display."""
-        self._config.option_int('width', 0)
+        return self._config.option_int('height', 0)
+
+    @property
+    def resolution(self) -> tuple:
+        """Return the native (width, height) of the display."""
+        return (self.width, self.height)
+
+    @property
+    def frame_id(self) -> Optional[str]:
+        """Return the id of the last frame shown, or None if there isn't one."""
+        return self._frame_id
 
     @property
     def max_upload_size(self) -> int:
         """Return the maximum upload size."""
         return self._max_upload_size
 
+    @property
+    def slow_request_ms(self) -> float:
+        """Return the duration after which requests are logged as slow."""
+        return self._slow_request_ms
+
+    @property
+    def admin_token(self) -> str:
+        """Return the token required by the admin endpoints."""
+        return self._admin_token
+
     def get_button_status(self) -> dict:
         """Return the current state of the buttons."""
         with self._button_lock:
@@ -56,6 +100,55 @@ class BaseDisplay:
                 return
             sleep(1)
 
+    def prepare(self, body: bytes) -> Image:
+        """
+        Turn an uploaded request body into an RGB frame in the display's
+        native resolution. This runs on the preprocessing pool so concurrent
+        uploads are decoded in parallel.
+
+        :param body: The request body.
+        :return: The RGB frame.
+        :raises ValueError: If the body is not a valid image.
+        """
+        return self._preprocessor.prepare(body, self.resolution)
+
+    def show(self, img: Image) -> str:
+        """
+        Update the display with a prepared frame, one request at a time.
+
+        :param img: The frame to draw.
+        :return: The id of the frame.
+        """
+        with stage('hash'):
+            img_id = frame_id(img)
+        with stage('update'), self._update_lock:
+            self.update(img)
+            self._frame = img
+            self._frame_id = img_id
+        return img_id
+
+    def show_delta(self, base_id: str, delta: bytes) -> str:
+        """
+        Update the display by applying a delta to the current frame.
+
+        :param base_id: The id of the frame the delta was encoded against.
+        :param delta: The encoded delta.
+        :return: The id of the new frame.
+        :raises StaleFrameError: If base_id is not the current frame.
+        :raises ValueError: If the delta is malformed.
+        """
+        with stage('update'), self._update_lock:
+            if self._frame is None or base_id != self._frame_id:
+                raise StaleFrameError(f'Frame {base_id} is not the current frame')
+            with stage('delta'):
+                img = apply_delta(self._frame, delta)
+            with stage('hash'):
+                img_id = frame_id(img)
+            self.update(img)
+            self._frame = img
+            self._frame_id = img_id
+        return img_id
+
     def update(self, img: Image) -> None:
         """
         Update the image on the display.
@@ -70,8 +163,70 @@ class BaseDisplay:
 
     def cleanup(self) -> None:
         """Cleanup the display object."""
+        self._preprocessor.shutdown()
+
+    def reconfigure(self, config: Config) -> list:
+        """
+        Apply a reloaded config without reinitialising the display. Nothing
+        is changed if any of the changes can't be applied live.
+
+        :param config: The new config.
+        :return: The names of the options that changed, plus 'buttons' if
+            the buttons changed.
+        :raises RestartRequiredError: If the display type or an option that
+            isn't live changed.
+        :raises ConfigError: If an option or button is invalid.
+        """
+        if (config.display_type, config.display_variant) != (self._config.display_type, self._config.display_variant):
+            raise RestartRequiredError("Changing the display type requires a restart")
+        old_options = self._config.options
+        new_options = config.options
+        changed = sorted(key for key in set(old_options) | set(new_options)
+                         if old_options.get(key) != new_options.get(key))
+        not_live = [key for key in changed if key not in self._live_options]
+        if not_live:
+            raise RestartRequiredError(f"Changing {', '.join(not_live)} requires a restart")
+        buttons_changed = config.buttons != self._config.buttons
+
+        with self._update_lock:
+            old_config = self._config
+            self._config = config
+            try:
+                self._load_options()
+                if buttons_changed:
+                    self._reload_buttons()
+            except (ConfigError, ValueError) as e:
+                self._config = old_config
+                self._load_options()
+                if buttons_changed:
+                    self._reload_buttons()
+                if isinstance(e, ConfigError):
+                    raise
+                raise ConfigError(f'Invalid option value: {e}')
+
+        return changed + (['buttons'] if buttons_changed else [])
+
+    def _setup_buttons(self) -> None:
+        """
+        Setup the buttons in the config, replacing _button_defs once they
+        are all ready.
+
+        :raises ConfigError: If a button spec is invalid.
+        """
+        with self._button_lock:
+            self._button_defs = dict(self._config.buttons)
+
+    def _teardown_buttons(self) -> None:
+        """Stop listening for the buttons set up by _setup_buttons."""
         pass
 
+    def _reload_buttons(self) -> None:
+        """Replace the buttons with those in the config, keeping the status of unchanged labels."""
+        self._teardown_buttons()
+        self._setup_buttons()
+        with self._button_lock:
+            self._button_status = {label: self._button_status.get(label, 0) for label in self._button_defs}
+
     def _handle_button_pressed(self, pin: int) -> None:
         """
         Update the status of a button to say it was pressed now.
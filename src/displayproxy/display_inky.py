@@ -1,9 +1,9 @@
 from displayproxy.display_base import BaseDisplay
-from displayproxy.config import Config
+from displayproxy.config import Config, ConfigError
+from displayproxy.profiling import stage
 
 
 try:
-    from copy import deepcopy
     from sys import exit
 
     from inky.auto import auto
@@ -12,10 +12,19 @@ try:
 
     class InkyDisplay(BaseDisplay):
         """Displays images on an Inky display."""
+        _live_options = BaseDisplay._live_options | {
+            'saturation', 'border_colour', 'diff_percent_threshold', 'diff_mode', 'diff_tolerance',
+        }
         _default_options = {
             "saturation": 0.5,
             "border_colour": "black",
             "diff_percent_threshold": 1.0,
+            # Compare frames as sent ('rgb') or by the nearest panel colour
+            # of each pixel ('palette').
+            "diff_mode": 'rgb',
+            # Pixels whose channels all differ by no more than this (0-255)
+            # are not counted as changed.
+            "diff_tolerance": 0,
         }
 
         def __init__(self, config: Config):
@@ -27,17 +36,27 @@ try:
             """
             super().__init__(config)
 
-            self._saturation = self._config.option_float('saturation', self._default_options['saturation'])
-            self._border_colour = self._config.option_str('border_colour', self._default_options['border_colour'])
-            self._diff_percent_threshold = self._config.option_float('diff_percent_threshold', self._default_options['diff_percent_threshold'])
-
             try:
                 self._display = auto(ask_user=False, verbose=False)
             except TypeError:
                 exit('You need to update the Inky library to >= v1.1.0')
 
             self._current_image = None
-            self._setup_buttons()
+            try:
+                self._setup_buttons()
+            except ConfigError as e:
+                exit(str(e))
+
+        def _load_options(self) -> None:
+            """Read the live options from the config."""
+            super()._load_options()
+            self._saturation = self._config.option_float('saturation', self._default_options['saturation'])
+            self._border_colour = self._config.option_str('border_colour', self._default_options['border_colour'])
+            self._diff_percent_threshold = self._config.option_float('diff_percent_threshold', self._default_options['diff_percent_threshold'])
+            self._diff_mode = self._config.option_str('diff_mode', self._default_options['diff_mode'])
+            if self._diff_mode not in ['rgb', 'palette']:
+                raise ConfigError(f"Unsupported diff_mode: {self._diff_mode}; supported: rgb, palette")
+            self._diff_tolerance = self._config.option_int('diff_tolerance', self._default_options['diff_tolerance'])
 
         @property
         def width(self) -> int:
@@ -54,11 +73,14 @@ try:
             Setup the buttons.
             """
             GPIO.setmode(GPIO.BCM)
-            for label in self._button_defs.keys():
+            # Button definitions are just the pin number so the callback can
+            # look up the label.
+            button_defs = {}
+            for label, spec in self._config.buttons.items():
                 try:
                     # The pin will default to pull-up and falling edge unless
                     # the pin ends in 'd' (for down)
-                    pin_def = self._button_defs[label].lower()
+                    pin_def = spec.lower()
                     pull_up_down = GPIO.PUD_UP
                     if pin_def.endswith('d'):
                         pin_def = int(pin_def[:-1])
@@ -72,53 +94,64 @@ try:
                     GPIO.setup([pin_def], GPIO.IN, pull_up_down=pull_up_down)
                     GPIO.add_event_detect(pin_def, GPIO.FALLING if pull_up_down == GPIO.PUD_UP else GPIO.RISING,
                                           self._handle_button_pressed, bouncetime=500)
-
-                    # Update the button definition to just be the pin number so
-                    # the callback can look up the label.
-                    self._button_defs[label] = pin_def
+                    button_defs[label] = pin_def
                 except Exception as e:
-                    exit(f"Error setting up button '{label}': {e}")
+                    for pin in button_defs.values():
+                        GPIO.remove_event_detect(pin)
+                    raise ConfigError(f"Error setting up button '{label}': {e}")
 
-        def _compare_pixels(self, currentImage: Image, newImage: Image) -> float:
-            """
-            Compare two PIL Image objects pixel by pixel, returning the percentage
-            of pixels that differ. Returns 100 if the images are different sizes.
+            with self._button_lock:
+                self._button_defs = button_defs
+
+        def _teardown_buttons(self) -> None:
+            """Stop listening for the buttons."""
+            for pin in self._button_defs.values():
+                GPIO.remove_event_detect(pin)
 
-            :param img1: The first image to compare.
-            :param img2: The second image to compare.
-            :return: The percentage of pixels that differ between the two images.
+        @property
+        def resolution(self) -> tuple:
+            """Return the native (width, height) of the display."""
+            return self._display.resolution
+
+        def _diff_palette(self):
             """
-            pixels1 = list(currentImage.getdata())
-            pixels2 = list(newImage.getdata())
-            if len(pixels1) != len(pixels2):
-                return 100
-            mismatch = 0
-            for i in range(0, len(pixels1)):
-                if pixels1[i] != pixels2[i]:
-                    mismatch += 1
-            return mismatch/len(pixels1)*100
+            Return the panel's palette at the configured saturation if frames
+            are compared as they will be shown, otherwise None. Panels without
+            a blended palette are always compared as RGB.
+            """
+            if self._diff_mode != 'palette':
+                return None
+            palette_blend = getattr(self._display, '_palette_blend', None)
+            if palette_blend is None:
+                return None
+            return list(palette_blend(self._saturation))
 
         def update(self, img: Image) -> None:
             """
             Update the image on the display. The image will be stretched to fit the
             display resolution. The display will only be updated if the new image
             differs from the last image displayed by more than the diff_percent_threshold.
+            With the palette diff_mode pixels that map to the same panel colour
+            are not counted as changed.
 
             :param img: The image to draw.
-            :param saturation: The saturation of the display.
-            :param border_colour: The colour of the border.
             """
-            rgb_img = img.convert('RGB')
+            rgb_img = img.convert('RGB') if img.mode != 'RGB' else img
+            if rgb_img.size != self._display.resolution:
+                rgb_img = rgb_img.resize(self._display.resolution)
 
             diff_percent = 100
             if self._current_image is not None:
-                diff_percent = self._compare_pixels(self._current_image, rgb_img)
-
-            if diff_percent == -1 or diff_percent > self._diff_percent_threshold:
-                self._current_image = deepcopy(rgb_img)
-                self._display.set_image(img.resize(self._display.resolution), saturation=self._saturation)
-                self._display.set_border(self._border_colour)
-                self._display.show()
+                with stage('diff'):
+                    diff_percent = self._preprocessor.diff_percent(self._current_image, rgb_img,
+                                                                   self._diff_tolerance, self._diff_palette())
+
+            if diff_percent > self._diff_percent_threshold:
+                self._current_image = rgb_img.copy()
+                with stage('refresh'):
+                    self._display.set_image(rgb_img, saturation=self._saturation)
+                    self._display.set_border(self._border_colour)
+                    self._display.show()
 
 except ImportError:
     class InkyDisplay(BaseDisplay):
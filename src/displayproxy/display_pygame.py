@@ -8,7 +8,7 @@ with contextlib.redirect_stdout(None):
     import pygame
 
 from displayproxy.display_base import BaseDisplay
-from displayproxy.config import Config
+from displayproxy.config import Config, ConfigError
 
 
 class PygameDisplay(BaseDisplay):
@@ -41,9 +41,9 @@ class PygameDisplay(BaseDisplay):
         self._height = self._config.option_int('height', self._default_options['height'])
         self._button_color = pygame.Color(self._config.option_str('button_color'))
         self._show_buttons = self._button_color != ''
-        if self._show_buttons:
-            self._button_surfaces = {}
-            self._button_hover_surfaces = {}
+        self._button_surfaces = {}
+        self._button_hover_surfaces = {}
+        self._pending_button_defs = None
 
         pygame.init()
         pygame.display.set_caption("displayproxy")
@@ -61,7 +61,11 @@ class PygameDisplay(BaseDisplay):
         if self._hide_cursor:
             pygame.mouse.set_visible(0)
 
-        self._setup_buttons()
+        try:
+            self._setup_buttons()
+        except ConfigError as e:
+            exit(str(e))
+        self._apply_buttons()
 
         # Draw the initial screen.
         self._current_surface = pygame.Surface((self._width, self._height))
@@ -83,6 +87,7 @@ class PygameDisplay(BaseDisplay):
                 return
 
             try:
+                self._apply_buttons()
                 for event in pygame.event.get():
                     if event.type == pygame.QUIT:
                         return
@@ -124,40 +129,81 @@ class PygameDisplay(BaseDisplay):
 
     def cleanup(self) -> None:
         """Cleanup the display object."""
+        super().cleanup()
         pygame.quit()
 
     def _setup_buttons(self) -> None:
         """
-        Setup the buttons.
+        Parse the buttons and queue them for the run loop, which draws their
+        surfaces and swaps them in. pygame isn't thread-safe and a reload
+        runs on a server thread, so nothing is drawn here.
+
+        :raises ConfigError: If a button spec is invalid.
         """
-        for label in self._button_defs.keys():
+        button_defs = {}
+        for label, spec in self._config.buttons.items():
             try:
-                x1, y1, x2, y2 = self._button_defs[label].split(',')
-                self._button_defs[label] = pygame.Rect(int(x1), int(y1), int(x2) - int(x1), int(y2) - int(y1))
-
-                if self._show_buttons:
-                    s = pygame.Surface((self._button_defs[label].width, self._button_defs[label].height), pygame.SRCALPHA)
-                    pygame.draw.rect(s, self._button_color, (0, 0, self._button_defs[label].width, self._button_defs[label].height), 3)
-                    size = 10
-                    while True:
-                        f = pygame.font.SysFont('Arial', size)
-                        st = f.render(label, True, self._button_color)
-                        r = st.get_rect()
-                        if r.width > self._button_defs[label].width - 20 or r.height > self._button_defs[label].height - 20:
-                            s.blit(st, ((self._button_defs[label].width - r.width) // 2, (self._button_defs[label].height - r.height) // 2))
-                            self._button_surfaces[label] = s
-
-                            hover_color = deepcopy(self._button_color)
-                            hover_color.a = 128
-                            self._button_hover_surfaces[label] = pygame.Surface((self._button_defs[label].width, self._button_defs[label].height), pygame.SRCALPHA)
-                            self._button_hover_surfaces[label].fill(hover_color)
-                            self._button_hover_surfaces[label].blit(s, (0, 0))
-
-                            self._button_surfaces[label].set_alpha(128)
-                            break
-                        size += 2
+                x1, y1, x2, y2 = spec.split(',')
+                button_defs[label] = pygame.Rect(int(x1), int(y1), int(x2) - int(x1), int(y2) - int(y1))
             except Exception as e:
-                exit(f"Error setting up button '{label}': {e}")
+                raise ConfigError(f"Error setting up button '{label}': {e}")
+
+        with self._button_lock:
+            self._pending_button_defs = button_defs
+
+    def _reload_buttons(self) -> None:
+        """Queue the buttons in the config; the status is updated when the run loop swaps them in."""
+        self._setup_buttons()
+
+    def _apply_buttons(self) -> None:
+        """
+        Swap in the buttons queued by _setup_buttons, if any, keeping the
+        status of unchanged labels. Must be called on the pygame thread.
+        """
+        with self._button_lock:
+            button_defs, self._pending_button_defs = self._pending_button_defs, None
+        if button_defs is None:
+            return
+
+        button_surfaces = {}
+        button_hover_surfaces = {}
+        if self._show_buttons:
+            for label, rect in button_defs.items():
+                button_surfaces[label], button_hover_surfaces[label] = self._draw_button_surfaces(label, rect)
+
+        with self._button_lock:
+            self._button_defs = button_defs
+            self._button_status = {label: self._button_status.get(label, 0) for label in button_defs}
+        self._button_surfaces = button_surfaces
+        self._button_hover_surfaces = button_hover_surfaces
+
+    def _draw_button_surfaces(self, label: str, rect: pygame.Rect) -> tuple:
+        """
+        Draw the surfaces for a button and its label.
+
+        :param label: The button label.
+        :param rect: The area of the button.
+        :return: The (normal, hover) surfaces.
+        """
+        s = pygame.Surface((rect.width, rect.height), pygame.SRCALPHA)
+        pygame.draw.rect(s, self._button_color, (0, 0, rect.width, rect.height), 3)
+        size = 10
+        while True:
+            f = pygame.font.SysFont('Arial', size)
+            st = f.render(label, True, self._button_color)
+            r = st.get_rect()
+            if r.width > rect.width - 20 or r.height > rect.height - 20:
+                s.blit(st, ((rect.width - r.width) // 2, (rect.height - r.height) // 2))
+
+                hover_color = deepcopy(self._button_color)
+                hover_color.a = 128
+                hover = pygame.Surface((rect.width, rect.height), pygame.SRCALPHA)
+                hover.fill(hover_color)
+                hover.blit(s, (0, 0))
+
+                s.set_alpha(128)
+                return s, hover
+            size += 2
 
     def _draw_buttons(self) -> None:
         """
@@ -1,13 +1,12 @@
 """displayproxy server module."""
-from http.server import BaseHTTPRequestHandler, HTTPStatus
-import io
-import json
-from PIL import Image
+from http.server import BaseHTTPRequestHandler
 
-from displayproxy.__version__ import __version__
+from displayproxy.app import ProxyApp
 
 
-def MakeProxyHandler(display):
+def MakeProxyHandler(display, frame_buffer=None, reload_config=None):
+    app = ProxyApp(display, frame_buffer, reload_config)
+
     class ProxyHandler(BaseHTTPRequestHandler):
         """
         HTTP request handler for the ProxyServer.
@@ -20,84 +19,19 @@ def MakeProxyHandler(display):
             """Suppress logging of requests."""
             pass
 
-        def _send_headers(self, status: HTTPStatus, headers: dict = {}):
-            """Set the response headers."""
-            self.send_response(status)
-            self.send_header('Server', f'displayproxy/{__version__} (https://github.com/stut/displayproxy)')
-            for key, value in headers.items():
-                self.send_header(key, value)
-            self.end_headers()
-
         def do_GET(self):
-            if self.path == '/info':
-                self._do_get_info()
-            elif self.path == '/buttons':
-                self._do_get_buttons()
-            else:
-                self._do_404()
+            self._handle()
 
         def do_POST(self):
-            if self.path == '/update':
-                self._do_post_update()
-            elif self.path == '/shutdown':
-                self._do_shutdown()
-            else:
-                self._do_404()
-
-        def _do_404(self):
-            """Send a 404 response."""
-            self._send_headers(HTTPStatus.NOT_FOUND, {'Content-type': 'text/plain'})
-            self.wfile.write(bytes('Not found', 'utf8'))
-
-        def _do_get_info(self):
-            """Return information about the display."""
-            info = {
-                'width': display.width,
-                'height': display.height,
-            }
-            self._send_headers(HTTPStatus.OK, {'Content-type': 'application/json'})
-            self.wfile.write(bytes(json.dumps(info), 'utf8'))
+            self._handle()
 
-        def _do_get_buttons(self):
-            """Return the current state of the buttons."""
-            self._send_headers(HTTPStatus.OK, {'Content-type': 'application/json'})
-            self.wfile.write(bytes(json.dumps(display.get_button_status()), 'utf8'))
-
-        def _do_post_update(self):
-            """Update the display with the posted image."""
-            content_len = int(self.headers.get('content-length', 0))
-            if content_len == 0:
-                self._send_headers(HTTPStatus.BAD_REQUEST)
-                self.wfile.write(bytes('No content length', 'utf8'))
-                return
-            if content_len > display.max_upload_size:
-                self._send_headers(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
-                self.wfile.write(bytes('Content too large', 'utf8'))
-                return
-
-            post_body = self.rfile.read(content_len)
-            bytes_io = io.BytesIO(post_body)
-            img = None
-            try:
-                img = Image.open(bytes_io)
-            except Exception:
-                for fmt in ['RGBA', 'RGB']:
-                    try:
-                        img = Image.frombytes(fmt, (display.width, display.height), post_body)
-                        break
-                    except Exception:
-                        continue
-                if img is None:
-                    self._send_headers(HTTPStatus.BAD_REQUEST)
-                    self.wfile.write(bytes('Invalid image data', 'utf8'))
-                    return
-            display.update(img)
-
-            self._send_headers(HTTPStatus.NO_CONTENT)
-
-        def _do_shutdown(self):
-            """Stop the display which will cause the process to end."""
-            display.shutdown()
-            self._send_headers(HTTPStatus.ACCEPTED)
+        def _handle(self):
+            """Pass the request to the app and send its response."""
+            response = app.handle(self.command, self.path, self.headers, self.rfile)
+            self.send_response(response.status)
+            for key, value in response.headers.items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(response.body)
 
     return ProxyHandler
@@ -0,0 +1,205 @@
+"""Frame preprocessing pipeline."""
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+import io
+import multiprocessing
+import os
+from typing import Optional
+
+from PIL import Image, ImageChops
+
+from displayproxy.config import Config
+from displayproxy.profiling import stage
+
+__all__ = ['FramePreprocessor']
+
+
+def _decode(body: bytes, size: tuple) -> Image:
+    """
+    Decode an uploaded image and stretch it to the given size. Bodies that
+    pillow cannot open are treated as raw RGBA or RGB pixel data of that size.
+    Resizing needs neighbouring rows so it is never split into bands.
+
+    :param body: The request body.
+    :param size: The native (width, height) of the display.
+    :return: The decoded image.
+    :raises ValueError: If the body is not a valid image.
+    """
+    img = None
+    try:
+        img = Image.open(io.BytesIO(body))
+        img.load()
+    except Exception:
+        for fmt in ['RGBA', 'RGB']:
+            try:
+                img = Image.frombytes(fmt, size, body)
+                break
+            except Exception:
+                continue
+        if img is None:
+            raise ValueError('Invalid image data')
+    if img.size != size:
+        img = img.resize(size)
+    return img
+
+
+def _convert(band: Image) -> Image:
+    """Convert a band of an image to RGB."""
+    return band.convert('RGB')
+
+
+def _nearest(band: Image, palette: list) -> Image:
+    """
+    Map each pixel of an RGB band to the nearest palette colour. There is no
+    dithering, which would spread any change across the rest of the frame.
+
+    :param band: The RGB band.
+    :param palette: A flat list of up to 256 RGB palette entries.
+    :return: The band in the palette colours, as RGB.
+    """
+    palette_image = Image.new('P', (1, 1))
+    # Padded with black as the Inky library does.
+    palette_image.putpalette(palette + [0, 0, 0] * (256 - len(palette) // 3))
+    return band.quantize(palette=palette_image, dither=Image.Dither.NONE).convert('RGB')
+
+
+def _changed_mask(band1: Image, band2: Image, tolerance: int = 0) -> Image:
+    """
+    Return an "L" mask that is 255 where any channel of two RGB bands of the
+    same size differs by more than the tolerance, and 0 elsewhere.
+    """
+    mask = None
+    for channel in ImageChops.difference(band1, band2).split():
+        channel = channel.point(lambda v: 255 if v > tolerance else 0)
+        mask = channel if mask is None else ImageChops.lighter(mask, channel)
+    return mask
+
+
+def _count_changed(band1: Image, band2: Image, tolerance: int = 0, palette: Optional[list] = None) -> int:
+    """
+    Count the pixels that differ between two RGB bands of the same size.
+
+    :param band1: The first band.
+    :param band2: The second band.
+    :param tolerance: Channel differences up to this are ignored.
+    :param palette: If given, pixels that still map to the same nearest
+        palette colour are also ignored.
+    :return: The number of pixels that differ.
+    """
+    mask = _changed_mask(band1, band2, tolerance)
+    if palette is not None:
+        mask = ImageChops.darker(mask, _changed_mask(_nearest(band1, palette), _nearest(band2, palette)))
+    return mask.histogram()[255]
+
+
+class FramePreprocessor:
+    """
+    Turns uploaded request bodies into frames in the display's native
+    resolution, spreading the work over a pool of threads. Decoding can use a
+    pool of processes instead, since only the compressed body and the decoded
+    frame have to be copied between them.
+    """
+    _default_options = {
+        # Number of workers; 0 uses one per CPU core.
+        "preprocess_workers": 0,
+        # Either 'thread' or 'process'.
+        "preprocess_pool": 'thread',
+        # Images taller than two bands are converted and diffed in bands of
+        # this many rows.
+        "preprocess_band_height": 64,
+    }
+
+    def __init__(self, config: Config):
+        """
+        Create the worker pools.
+
+        :param config: The display configuration.
+        """
+        self._workers = config.option_int('preprocess_workers', self._default_options['preprocess_workers'])
+        if self._workers <= 0:
+            self._workers = os.cpu_count() or 1
+        self._band_height = max(1, config.option_int('preprocess_band_height',
+                                                     self._default_options['preprocess_band_height']))
+
+        self._pool = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix='displayproxy-preprocess')
+        pool_type = config.option_str('preprocess_pool', self._default_options['preprocess_pool'])
+        if pool_type == 'thread':
+            self._decode_pool: Executor = self._pool
+        elif pool_type == 'process':
+            # Workers start lazily, by which time the process has server and
+            # display threads and pygame or GPIO state that isn't safe to
+            # fork, so start them from a clean process instead.
+            start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            self._decode_pool = ProcessPoolExecutor(max_workers=self._workers,
+                                                    mp_context=multiprocessing.get_context(start_method))
+        else:
+            exit(f"Unsupported preprocess_pool: {pool_type}; supported: thread, process")
+
+    def prepare(self, body: bytes, size: tuple) -> Image:
+        """
+        Decode, resize and convert an uploaded image into an RGB frame of the
+        given size.
+
+        :param body: The request body.
+        :param size: The native (width, height) of the display.
+        :return: The RGB frame.
+        :raises ValueError: If the body is not a valid image.
+        """
+        with stage('decode'):
+            img = self._decode_pool.submit(_decode, body, size).result()
+        if img.mode == 'RGB':
+            return img
+
+        with stage('convert'):
+            bands = self._bands(img.size)
+            if len(bands) == 1:
+                return self._pool.submit(_convert, img).result()
+
+            frame = Image.new('RGB', img.size)
+            converted = self._pool.map(_convert, [img.crop(box) for box in bands])
+            for box, band in zip(bands, converted):
+                frame.paste(band, box)
+            return frame
+
+    def diff_percent(self, img1: Image, img2: Image, tolerance: int = 0, palette: Optional[list] = None) -> float:
+        """
+        Compare two RGB images, returning the percentage of pixels that
+        differ. Returns 100 if the images are different sizes.
+
+        :param img1: The first image to compare.
+        :param img2: The second image to compare.
+        :param tolerance: Pixels whose channels all differ by no more than
+            this are counted as the same.
+        :param palette: A flat list of RGB palette entries. If given, pixels
+            that map to the same nearest palette colour are counted as the
+            same.
+        :return: The percentage of pixels that differ between the two images.
+        """
+        if img1.size != img2.size:
+            return 100
+        bands = self._bands(img1.size)
+        changed = sum(self._pool.map(_count_changed,
+                                     [img1.crop(box) for box in bands],
+                                     [img2.crop(box) for box in bands],
+                                     [tolerance] * len(bands),
+                                     [palette] * len(bands)))
+        return changed / (img1.width * img1.height) * 100
+
+    def shutdown(self) -> None:
+        """Stop the worker pools."""
+        self._pool.shutdown(wait=False)
+        if self._decode_pool is not self._pool:
+            self._decode_pool.shutdown(wait=False)
+
+    def _bands(self, size: tuple) -> list:
+        """
+        Split an image of the given size into horizontal bands. Images that
+        are less than two bands tall, or a single worker, get one band.
+
+        :param size: The (width, height) of the image.
+        :return: A list of (left, upper, right, lower) boxes.
+        """
+        width, height = size
+        if self._workers == 1 or height < self._band_height * 2:
+            return [(0, 0, width, height)]
+        return [(0, top, width, min(top + self._band_height, height))
+                for top in range(0, height, self._band_height)]
@@ -0,0 +1,127 @@
+"""Request timing and on-demand profiling."""
+from contextlib import contextmanager
+import os
+import sys
+from threading import get_ident, local
+from time import monotonic, perf_counter, sleep
+
+__all__ = ['RequestTimer', 'timed_request', 'stage', 'sample_profile']
+
+_local = local()
+
+# Stacks whose innermost Python frame is in one of these modules are threads
+# waiting for work rather than doing it.
+_idle_modules = {'selectors.py', 'socketserver.py', 'threading.py', 'queue.py', 'thread.py'}
+
+
+class RequestTimer:
+    """Collects the time spent in each stage of a request."""
+
+    def __init__(self):
+        self._start = perf_counter()
+        self._stages = {}
+
+    @property
+    def elapsed_ms(self) -> float:
+        """Return the time since the request started in milliseconds."""
+        return (perf_counter() - self._start) * 1000
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Time a stage of the request. Stages with the same name are summed.
+
+        :param name: The name of the stage.
+        """
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self._stages[name] = self._stages.get(name, 0.0) + (perf_counter() - start) * 1000
+
+    def server_timing(self) -> str:
+        """Return the stage timings as a Server-Timing header value."""
+        metrics = [f'{name};dur={duration:.1f}' for name, duration in self._stages.items()]
+        metrics.append(f'total;dur={self.elapsed_ms:.1f}')
+        return ', '.join(metrics)
+
+    def describe(self) -> str:
+        """Return the stage timings in a form suitable for logging."""
+        return ' '.join(f'{name}={duration:.1f}ms' for name, duration in self._stages.items())
+
+
+@contextmanager
+def timed_request():
+    """Time a request handled by the current thread, yielding its RequestTimer."""
+    timer = RequestTimer()
+    _local.timer = timer
+    try:
+        yield timer
+    finally:
+        _local.timer = None
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Time a stage of the request being handled by the current thread. Does
+    nothing if the thread is not handling a timed request.
+
+    :param name: The name of the stage.
+    """
+    timer = getattr(_local, 'timer', None)
+    if timer is None:
+        yield
+        return
+    with timer.stage(name):
+        yield
+
+
+def sample_profile(seconds: float, interval: float = 0.005) -> str:
+    """
+    Sample the stacks of every other thread in the process for a while and
+    report where they spent their time. Unlike cProfile this sees the request,
+    preprocessing and display threads rather than just the calling thread.
+
+    :param seconds: How long to sample for.
+    :param interval: The time between samples in seconds.
+    :return: A plain text report of the busiest functions.
+    """
+    own_thread = get_ident()
+    own_counts = {}
+    total_counts = {}
+    samples = 0
+    idle = 0
+
+    deadline = monotonic() + seconds
+    while monotonic() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread:
+                continue
+            if os.path.basename(frame.f_code.co_filename) in _idle_modules:
+                idle += 1
+                continue
+            samples += 1
+            key = _describe_frame(frame)
+            own_counts[key] = own_counts.get(key, 0) + 1
+            seen = set()
+            while frame is not None:
+                key = _describe_frame(frame)
+                if key not in seen:
+                    seen.add(key)
+                    total_counts[key] = total_counts.get(key, 0) + 1
+                frame = frame.f_back
+        sleep(interval)
+
+    lines = [f'{samples} busy and {idle} idle thread samples over {seconds:.1f}s every {interval * 1000:.1f}ms',
+             '',
+             '  self%  total%  function']
+    for key, count in sorted(total_counts.items(), key=lambda item: item[1], reverse=True)[:50]:
+        lines.append(f'{own_counts.get(key, 0) / samples:7.1%} {count / samples:7.1%}  {key}')
+    return '\n'.join(lines) + '\n'
+
+
+def _describe_frame(frame) -> str:
+    """Return a short description of the function a frame is running."""
+    code = frame.f_code
+    return f'{os.path.basename(code.co_filename)}:{code.co_firstlineno}({code.co_name})'
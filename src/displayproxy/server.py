@@ -1,14 +1,17 @@
 """displayproxy server module."""
 
 import atexit
-from http.server import HTTPServer
+from http.server import ThreadingHTTPServer
 import os
+import signal
 import sys
-from threading import Thread
+from threading import Lock, Thread
 from typing import Optional
 
+from displayproxy.app import ProxyApp
 from displayproxy.handler import MakeProxyHandler
-from displayproxy.config import Config
+from displayproxy.config import Config, ConfigError
+from displayproxy.shm import SharedFrameBuffer
 
 __all__ = ['ProxyServer']
 
@@ -22,7 +25,8 @@ class ProxyServer:
     def __init__(self, display_type: str,
                  host: str = 'localhost', port: int = 8000,
                  display_type_defaults: Optional[dict] = None,
-                 buttons: str = '', options: str = ''):
+                 buttons: str = '', options: str = '',
+                 engine: str = 'threading', config_file: str = ''):
         """
         Create an ProxyServer.
 
@@ -32,11 +36,20 @@ class ProxyServer:
             'pin=label,pin=label,...'.
         :param options: A display type specific string of options in the
             format 'key=value,key=value,...'.
+        :param engine: The HTTP server engine, either 'threading' or
+            'asyncio'.
+        :param config_file: The path to an INI file of buttons and options,
+            which is reloaded on SIGHUP or POST /config.
         """
         self._host = host
         self._port = port
+        if engine not in ['threading', 'asyncio']:
+            exit(f"Unsupported engine: {engine}; supported: threading, asyncio")
+        self._engine = engine
 
-        config = Config(display_type, buttons, options)
+        config = Config(display_type, buttons, options, config_file)
+        self._config = config
+        self._config_lock = Lock()
 
         if config.display_type == 'inky':
             from .display_inky import InkyDisplay
@@ -49,10 +62,56 @@ class ProxyServer:
 
         atexit.register(self._display.cleanup)
 
+        self._frame_buffer = None
+        shm_name = config.option_str('shared_memory', '')
+        if shm_name != '':
+            try:
+                self._frame_buffer = SharedFrameBuffer(
+                    shm_name, self._display.resolution,
+                    config.option_bool('shared_memory_replace', False))
+            except FileExistsError:
+                exit(f"Shared memory block {shm_name} already exists and may belong to another server; "
+                     f"set shared_memory_replace=true to replace one left behind by a server that "
+                     f"didn't shut down cleanly")
+            atexit.register(self._frame_buffer.close)
+
+    def reload_config(self) -> list:
+        """
+        Reload the config and apply it to the display without reinitialising
+        it. The running config is unchanged if the new one can't be applied.
+
+        :return: The names of the settings that changed.
+        :raises RestartRequiredError: If a setting that can't be changed
+            while running was changed.
+        :raises ConfigError: If the new config is invalid.
+        """
+        with self._config_lock:
+            config = self._config.reloaded()
+            changed = self._display.reconfigure(config)
+            self._config = config
+        sys.stderr.write(f"Config reloaded; changed: {', '.join(changed) or 'nothing'}\n")
+        return changed
+
+    def _handle_sighup(self, signum, frame) -> None:
+        """Reload the config in the background so the display loop isn't held up."""
+        def reload():
+            try:
+                self.reload_config()
+            except ConfigError as e:
+                sys.stderr.write(f"Config not reloaded: {e}\n")
+        Thread(target=reload).start()
+
     def start(self):
         """Start the server and run the display."""
         server_address = (self._host, self._port)
-        httpd = HTTPServer(server_address, MakeProxyHandler(self._display))
+        if self._engine == 'asyncio':
+            from .server_asyncio import AsyncHTTPServer
+            httpd = AsyncHTTPServer(server_address, ProxyApp(self._display, self._frame_buffer, self.reload_config))
+        else:
+            httpd = ThreadingHTTPServer(server_address,
+                                        MakeProxyHandler(self._display, self._frame_buffer, self.reload_config))
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, self._handle_sighup)
         t = Thread(target=httpd.serve_forever)
         t.start()
         sys.stderr.write(f"Server listening on {self._host}:{self._port}...\n")
@@ -73,6 +132,10 @@ def main():
                         help='button configuration (see docs; default: "")')
     parser.add_argument('--options', default='', type=str, metavar='OPTIONS',
                         help='type-specific display options (see docs; default: "")')
+    parser.add_argument('--config', default='', type=str, metavar='FILE',
+                        help='INI file of buttons and options, reloaded on SIGHUP (see docs; default: "")')
+    parser.add_argument('--engine', default='threading', choices=['threading', 'asyncio'],
+                        help='HTTP server engine (default: %(default)s)')
     parser.add_argument('display_type', type=str, metavar='DISPLAY_TYPE',
                         nargs='?', default='pygame',
                         help='type of display to use (supported: inky, pygame; default: pygame)')
@@ -85,6 +148,8 @@ def main():
             port=args.port,
             buttons=args.buttons,
             options=args.options,
+            engine=args.engine,
+            config_file=args.config,
         )
         server.start()
     except KeyboardInterrupt:
@@ -0,0 +1,180 @@
+"""displayproxy asyncio server engine."""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from email.parser import Parser
+from email.utils import formatdate
+from http import HTTPStatus
+from http.client import HTTPMessage
+import io
+import sys
+import traceback
+from typing import Optional
+
+from displayproxy.app import ProxyApp, Response
+
+__all__ = ['AsyncHTTPServer']
+
+# Limits on the request head, matching http.server.
+_MAX_LINE = 65536
+_MAX_HEADERS = 100
+
+
+class AsyncHTTPServer:
+    """
+    An HTTP/1.1 server built on asyncio streams. Idle and keep-alive
+    connections cost a coroutine rather than a thread. Request bodies are
+    read on the event loop, then requests that block, such as uploads waiting
+    for a display refresh, are handled by the ProxyApp on a thread pool.
+    Requests that don't, like /info and /buttons, are answered on the loop so
+    they never queue behind uploads.
+
+    It has the same serve_forever/shutdown interface as http.server.
+    """
+
+    def __init__(self, server_address: tuple, app: ProxyApp, max_workers: Optional[int] = None):
+        """
+        Create the server and bind to the address.
+
+        :param server_address: The (host, port) to listen on.
+        :param app: The app that handles requests.
+        :param max_workers: The size of the request thread pool; None uses
+            the ThreadPoolExecutor default.
+        """
+        self._app = app
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='displayproxy-request')
+        self._loop = asyncio.new_event_loop()
+        self._connections = set()
+        host, port = server_address
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle_connection, host, port, limit=_MAX_LINE))
+
+    def serve_forever(self) -> None:
+        """Handle connections until shutdown is called."""
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            # Idle keep-alive connections would otherwise keep wait_closed
+            # waiting forever on Python 3.12+.
+            connections = list(self._connections)
+            for task in connections:
+                task.cancel()
+            if connections:
+                self._loop.run_until_complete(asyncio.gather(*connections, return_exceptions=True))
+            self._loop.run_until_complete(self._server.wait_closed())
+            self._executor.shutdown(wait=False)
+            self._loop.close()
+
+    def shutdown(self) -> None:
+        """Stop serving; may be called from any thread."""
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Handle requests on a connection until either side closes it."""
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            keep_alive = True
+            while keep_alive:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                if isinstance(request, Response):
+                    await self._write_response(writer, request, False)
+                    break
+                command, path, version, headers = request
+
+                connection = headers.get('connection', '').lower()
+                if version == 'HTTP/1.1':
+                    keep_alive = connection != 'close'
+                else:
+                    keep_alive = connection == 'keep-alive'
+
+                # Chunked bodies aren't supported, so the rest of the stream
+                # can't be trusted to start with the next request.
+                if 'transfer-encoding' in headers:
+                    keep_alive = False
+
+                try:
+                    content_len = int(headers.get('content-length', 0) or 0)
+                    if content_len < 0:
+                        raise ValueError(content_len)
+                except ValueError:
+                    await self._write_response(writer, Response.text(HTTPStatus.BAD_REQUEST, 'Bad content length'),
+                                               False)
+                    break
+
+                # Read the body here so slow uploads don't tie up a worker
+                # thread. Bodies over the limit are left unread for the app
+                # to reject, and the connection is closed after the response.
+                body = b''
+                if 0 < content_len <= self._app.max_upload_size:
+                    body = await reader.readexactly(content_len)
+                elif content_len > 0:
+                    keep_alive = False
+
+                try:
+                    if self._app.blocks(command, path):
+                        response = await self._loop.run_in_executor(
+                            self._executor, self._app.handle, command, path, headers, io.BytesIO(body))
+                    else:
+                        response = self._app.handle(command, path, headers, io.BytesIO(body))
+                except Exception:
+                    sys.stderr.write(f"Error handling {command} {path}:\n{traceback.format_exc()}")
+                    response = Response.text(HTTPStatus.INTERNAL_SERVER_ERROR, 'Internal server error')
+                await self._write_response(writer, response, keep_alive)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            # Cancelled by serve_forever on shutdown; the connection just closes.
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        """
+        Read a request line and headers.
+
+        :return: A (command, path, version, headers) tuple, None if the
+            connection was closed, or an error Response for a bad request.
+        """
+        try:
+            request_line = await reader.readline()
+        except ValueError:
+            # readline raises ValueError when the line is over the limit.
+            return Response.text(HTTPStatus.REQUEST_URI_TOO_LONG, 'Request line too long')
+        if not request_line:
+            return None
+        words = request_line.decode('iso-8859-1').rstrip('\r\n').split()
+        if len(words) != 3 or not words[2].startswith('HTTP/'):
+            return Response.text(HTTPStatus.BAD_REQUEST, 'Bad request syntax')
+        command, path, version = words
+
+        lines = []
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                return Response.text(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, 'Header line too long')
+            if line in (b'\r\n', b'\n', b''):
+                break
+            lines.append(line)
+            if len(lines) > _MAX_HEADERS:
+                return Response.text(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, 'Too many headers')
+        headers = Parser(_class=HTTPMessage).parsestr(b''.join(lines).decode('iso-8859-1'))
+        return command, path, version, headers
+
+    async def _write_response(self, writer: asyncio.StreamWriter, response: Response, keep_alive: bool) -> None:
+        """Write a response to the connection."""
+        status = HTTPStatus(response.status)
+        head = [f'HTTP/1.1 {status.value} {status.phrase}',
+                f'Date: {formatdate(usegmt=True)}']
+        head.extend(f'{key}: {value}' for key, value in response.headers.items())
+        # RFC 9110 forbids a Content-Length on informational and 204 responses.
+        if status.value >= 200 and status != HTTPStatus.NO_CONTENT:
+            head.append(f'Content-Length: {len(response.body)}')
+        head.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+        writer.write(bytes('\r\n'.join(head) + '\r\n\r\n', 'iso-8859-1') + response.body)
+        await writer.drain()
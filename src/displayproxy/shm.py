@@ -0,0 +1,148 @@
+"""
+Shared memory frame buffers for renderers on the same host.
+
+The server publishes a buffer holding one frame of raw RGB pixels in the
+display's native resolution. A renderer draws into it and POSTs to /commit,
+and the server shows the pixels without an HTTP body or any decoding.
+"""
+import json
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Optional
+from urllib.request import Request, urlopen
+
+from PIL import Image
+
+__all__ = ['SharedFrameBuffer', 'SharedFrameClient']
+
+
+class SharedFrameBuffer:
+    """The server side of a shared memory frame buffer."""
+
+    def __init__(self, name: str, size: tuple, replace: bool = False):
+        """
+        Create the shared memory. It is only readable and writable by the
+        user running the server.
+
+        :param name: The name of the shared memory block.
+        :param size: The native (width, height) of the display.
+        :param replace: Replace an existing block with the same name, such
+            as one left behind by a server that did not shut down cleanly.
+        :raises FileExistsError: If the block exists and replace is False.
+        """
+        self._size = size
+        length = size[0] * size[1] * 3
+        try:
+            self._shm = SharedMemory(name=name, create=True, size=length)
+        except FileExistsError:
+            if not replace:
+                raise
+            stale = SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self._shm = SharedMemory(name=name, create=True, size=length)
+
+    @property
+    def name(self) -> str:
+        """Return the name of the shared memory block."""
+        return self._shm.name
+
+    @property
+    def size(self) -> tuple:
+        """Return the (width, height) of the frame."""
+        return self._size
+
+    def read(self) -> Image:
+        """
+        Return a copy of the frame currently in the buffer, so the renderer
+        can start drawing the next one straight away.
+        """
+        return Image.frombytes('RGB', self._size, self._shm.buf[:self._size[0] * self._size[1] * 3])
+
+    def close(self) -> None:
+        """Close and remove the shared memory."""
+        self._shm.close()
+        self._shm.unlink()
+
+
+class SharedFrameClient:
+    """
+    A renderer's view of a server's shared memory frame buffer.
+
+    Draw into `buffer` directly, or pass a pillow image to `draw`, then call
+    `commit` to show the frame. Don't draw while a commit is in progress.
+    """
+
+    def __init__(self, url: str = 'http://localhost:8000', timeout: float = 120.0):
+        """
+        Attach to the frame buffer published by a server.
+
+        :param url: The base URL of the server.
+        :param timeout: The timeout for requests to the server in seconds.
+        """
+        self._url = url.rstrip('/')
+        self._timeout = timeout
+        with urlopen(f'{self._url}/info', timeout=self._timeout) as response:
+            info = json.loads(response.read())
+        if not info.get('shared_memory'):
+            raise ValueError(f'{self._url} does not publish a shared memory frame buffer')
+
+        self._size = (info['width'], info['height'])
+        self._shm = self._attach(info['shared_memory'])
+        # Some platforms round the block up to a whole number of pages.
+        self._buffer = self._shm.buf[:self._size[0] * self._size[1] * 3]
+
+    @property
+    def size(self) -> tuple:
+        """Return the (width, height) of the frame."""
+        return self._size
+
+    @property
+    def buffer(self) -> memoryview:
+        """
+        Return the raw RGB pixels of the frame, one row after another. The
+        same view is returned each time and is released by close; release
+        any slices of it before then.
+        """
+        return self._buffer
+
+    def draw(self, img: Image) -> None:
+        """
+        Copy an image into the frame buffer.
+
+        :param img: The image to draw, which is stretched to fit the frame.
+        """
+        img = img.convert('RGB')
+        if img.size != self._size:
+            img = img.resize(self._size)
+        self.buffer[:] = img.tobytes()
+
+    def commit(self) -> Optional[str]:
+        """
+        Show the frame in the buffer.
+
+        :return: The id of the frame.
+        """
+        with urlopen(Request(f'{self._url}/commit', method='POST'), timeout=self._timeout) as response:
+            return response.headers.get('X-Frame-Id')
+
+    def close(self) -> None:
+        """Detach from the frame buffer; the server owns and removes it."""
+        self._buffer.release()
+        self._shm.close()
+
+    @staticmethod
+    def _attach(name: str) -> SharedMemory:
+        """
+        Attach to existing shared memory without letting this process's
+        resource tracker remove it when the renderer exits.
+
+        :param name: The name of the shared memory block.
+        """
+        try:
+            return SharedMemory(name=name, track=False)
+        except TypeError:
+            # Python < 3.13 always tracks shared memory.
+            shm = SharedMemory(name=name)
+            resource_tracker.unregister(shm._name, 'shared_memory')
+            return shm